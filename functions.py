@@ -1,19 +1,24 @@
 import subprocess
 import os
+import hashlib
+import shutil
+import io
+import time
+import threading
+import wave
 from glob import glob
 from pydub import AudioSegment
 import math
 from tqdm import tqdm
-import openai
 from langchain.schema.output_parser import BaseOutputParser
-from datetime import timedelta
+from datetime import datetime, timedelta
 import json
 import secrets
 from langchain.document_loaders import TextLoader
-from jiwer import wer
+from jiwer import process_words, wer
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 import re
+import gateway
 
 
 def initial_server() -> None:
@@ -47,22 +52,52 @@ def get_audio_chunk_dir(base_dir: str) -> str:
     return f"{base_dir}/media/chunks/audio"
 
 
-def get_echo_chunk_dir(base_dir: str) -> str:
-    return f"{base_dir}/media/chunks/echo"
+def get_echo_chunk_dir(attempt_dir: str) -> str:
+    return f"{attempt_dir}/chunks"
 
 
 def get_audio_transcript_path(base_dir: str) -> str:
     return f"{base_dir}/audio_transcript.txt"
 
 
-def get_echo_transcript_path(base_dir: str) -> str:
-    return f"{base_dir}/echo_transcript.txt"
+def get_transcript_chunk_dir(base_dir: str) -> str:
+    return f"{base_dir}/transcript"
+
+
+def get_transcript_chunk_path(base_dir: str, index: int) -> str:
+    return f"{get_transcript_chunk_dir(base_dir)}/chunk_{index}.json"
+
+
+def get_sentences_path(base_dir: str) -> str:
+    return f"{base_dir}/sentences.json"
+
+
+def get_echo_transcript_path(attempt_dir: str) -> str:
+    return f"{attempt_dir}/echo_transcript.txt"
 
 
 def get_metadata_path(base_dir: str) -> str:
     return f"{base_dir}/meta.json"
 
 
+def get_metadata(base_dir: str) -> dict:
+    metadata_path = get_metadata_path(base_dir)
+    if not os.path.exists(metadata_path):
+        return {}
+    with open(metadata_path, "r") as f:
+        return json.loads(f.read())
+
+
+metadata_lock = threading.Lock()
+
+
+def update_metadata(base_dir: str, **fields) -> None:
+    with metadata_lock:
+        metadata = get_metadata(base_dir)
+        metadata.update(fields)
+        write_atomic(get_metadata_path(base_dir), json.dumps(metadata))
+
+
 def get_video_name(video_id: str) -> str:
     base_dir = get_base_dir(video_id)
     metadata_path = get_metadata_path(base_dir)
@@ -87,8 +122,41 @@ def get_tmp_path(video_name) -> str:
     return f"./.cache/{video_name}"
 
 
-def get_echo_voice_path(base_dir: str) -> str:
-    return f"{base_dir}/media/echo.wav"
+def get_attempts_dir(base_dir: str) -> str:
+    return f"{base_dir}/attempts"
+
+
+def get_attempt_dir(base_dir: str, session_id: str, attempt_id: str) -> str:
+    return f"{get_attempts_dir(base_dir)}/{session_id}/{attempt_id}"
+
+
+def get_echo_voice_path(attempt_dir: str) -> str:
+    return f"{attempt_dir}/echo.wav"
+
+
+def get_shadow_result_path(attempt_dir: str) -> str:
+    return f"{attempt_dir}/result.json"
+
+
+def get_proxy_path(base_dir: str) -> str:
+    return f"{base_dir}/playback/proxy.mp4"
+
+
+def get_clip_dir(base_dir: str) -> str:
+    return f"{base_dir}/playback/clips"
+
+
+def get_clip_path(base_dir: str, start: timedelta, end: timedelta) -> str:
+    start_ms = int(start.total_seconds() * 1000)
+    end_ms = int(end.total_seconds() * 1000)
+    return f"{get_clip_dir(base_dir)}/{start_ms}_{end_ms}.mp4"
+
+
+def get_playback_path(base_dir: str) -> str:
+    proxy_path = get_proxy_path(base_dir)
+    if os.path.exists(proxy_path):
+        return proxy_path
+    return get_video_path(base_dir)
 
 
 def download_youtube_video(url: str) -> None:
@@ -115,9 +183,103 @@ def extract_audio_from_video(base_dir: str) -> None:
         subprocess.run(command)
 
 
+def create_playback_proxy(base_dir: str) -> None:
+    """
+    Encode a low-bitrate copy of the video for playback.
+
+    A keyframe is forced every second so that per-cue clips can be cut
+    from the proxy with stream copy instead of re-encoding.
+    """
+    video_path = get_video_path(base_dir)
+    proxy_path = get_proxy_path(base_dir)
+    if not os.path.exists(proxy_path):
+        os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+        # Encode under a temporary name so a half-written or failed encode
+        # is never mistaken for a ready proxy.
+        tmp_path = f"{proxy_path}.{secrets.token_hex(4)}.tmp"
+        command = [
+            "ffmpeg", "-i", video_path,
+            "-vf", "scale=-2:360",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "30",
+            "-force_key_frames", "expr:gte(t,n_forced*1)",
+            "-c:a", "aac", "-b:a", "64k",
+            "-movflags", "+faststart",
+            "-f", "mp4", tmp_path,
+        ]
+        try:
+            subprocess.run(command, check=True)
+        except subprocess.CalledProcessError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, proxy_path)
+
+
+def evict_clips(clip_dir: str, keep: str, max_bytes: int = 200 * 1024 * 1024) -> None:
+    clips = []
+    for clip in glob(f"{clip_dir}/*.mp4"):
+        if clip == keep:
+            continue
+        try:
+            clips.append((os.path.getmtime(clip), os.path.getsize(clip), clip))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in clips)
+    try:
+        total += os.path.getsize(keep)
+    except FileNotFoundError:
+        pass
+    for _, size, clip in sorted(clips):
+        if total <= max_bytes:
+            break
+        total -= size
+        try:
+            os.remove(clip)
+        except FileNotFoundError:
+            pass
+
+
+def get_cue_clip(base_dir: str, start: timedelta, end: timedelta) -> str | None:
+    """
+    Return a short clip of the proxy covering one cue, cutting it on first use.
+
+    Clips are keyed by cue range; the modification time is bumped on every
+    hit so `evict_clips` drops the least recently used ones first. Returns
+    None when there is no proxy or the clip could not be cut.
+    """
+    proxy_path = get_proxy_path(base_dir)
+    if not os.path.exists(proxy_path):
+        return None
+    clip_path = get_clip_path(base_dir, start, end)
+    try:
+        os.utime(clip_path)
+        return clip_path
+    except FileNotFoundError:
+        pass
+    clip_dir = get_clip_dir(base_dir)
+    os.makedirs(clip_dir, exist_ok=True)
+    tmp_path = f"{clip_path}.{secrets.token_hex(4)}.tmp"
+    command = [
+        "ffmpeg", "-ss", str(start.total_seconds()),
+        "-i", proxy_path,
+        "-t", str((end - start).total_seconds()),
+        "-c", "copy", "-avoid_negative_ts", "make_zero",
+        "-f", "mp4", tmp_path,
+    ]
+    try:
+        subprocess.run(command, check=True)
+    except subprocess.CalledProcessError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, clip_path)
+    evict_clips(clip_dir, keep=clip_path)
+    return clip_path
+
+
 def cut_audio_in_chunks(source: str, destination: str, chunk_size: int = 10) -> None:
     os.makedirs(destination, exist_ok=True)
-    track = AudioSegment.from_mp3(source)
+    track = AudioSegment.from_file(source)
     chunk_len = chunk_size * 60 * 1000
     chunks = math.ceil(len(track) / chunk_len)
 
@@ -128,18 +290,278 @@ def cut_audio_in_chunks(source: str, destination: str, chunk_size: int = 10) ->
         chunk.export(f"{destination}/chunk_{i}.mp3", format="mp3")
 
 
+def write_atomic(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def get_chunk_index(chunk_path: str) -> int:
+    return int(re.search(r"chunk_(\d+)", os.path.basename(chunk_path)).group(1))
+
+
+def get_chunk_files(chunks_dir: str) -> list[str]:
+    return sorted(glob(f"{chunks_dir}/chunk_*"), key=get_chunk_index)
+
+
 def transcribe_chunks(base_dir: str, chunks_dir: str, destination: str) -> None:
     if not os.path.exists(destination):
-        files = glob(f"{chunks_dir}/*")
+        files = get_chunk_files(chunks_dir)
+        transcripts = []
         for file in tqdm(files, "Transcribing audio chunks"):
-            with open(file, "rb") as audio_file, open(destination, "a") as text_file:
-                transcript = openai.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="vtt",
-                    language="en",
+            with open(file, "rb") as audio_file:
+                transcript = gateway.transcribe(
+                    audio_file.read(), os.path.basename(file)
                 )
-                text_file.write(transcript)
+                transcripts.append(transcript)
+        write_atomic(destination, "".join(transcripts))
+
+
+def get_media_duration(path: str) -> float:
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        path,
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True)
+    return float(result.stdout.strip())
+
+
+def export_audio_chunk(source: str, destination: str, index: int, chunk_size: int = 10) -> str:
+    """
+    Cut one chunk of audio straight from the source media.
+
+    Seeking with `-ss` only decodes this chunk, so the first chunk is ready
+    without decoding the whole file.
+    """
+    chunk_path = f"{destination}/chunk_{index}.mp3"
+    if not os.path.exists(chunk_path):
+        os.makedirs(destination, exist_ok=True)
+        tmp_path = f"{chunk_path}.{secrets.token_hex(4)}.tmp"
+        command = [
+            "ffmpeg", "-ss", str(index * chunk_size * 60),
+            "-t", str(chunk_size * 60),
+            "-i", source, "-vn",
+            "-c:a", "libmp3lame", "-b:a", "64k",
+            "-f", "mp3", tmp_path,
+        ]
+        try:
+            subprocess.run(command, check=True)
+        except subprocess.CalledProcessError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, chunk_path)
+    return chunk_path
+
+
+def transcribe_chunks_progressively(base_dir: str, source: str, chunks_dir: str, chunk_size: int = 10):
+    """
+    Export and transcribe audio chunks one by one, yielding `(done, total)`
+    after each.
+
+    Every chunk's VTT is stored with its absolute start offset as soon as it
+    is transcribed, so captions can be read while later chunks are pending.
+    Chunks that already have a record are skipped, so an interrupted run can
+    be resumed. The combined transcript is written once all chunks are done.
+    """
+    destination = get_audio_transcript_path(base_dir)
+    total = math.ceil(get_media_duration(source) / (chunk_size * 60))
+    transcripts = []
+    for index in range(total):
+        record_path = get_transcript_chunk_path(base_dir, index)
+        if os.path.exists(record_path):
+            with open(record_path, "r") as f:
+                record = json.loads(f.read())
+        else:
+            file = export_audio_chunk(source, chunks_dir, index, chunk_size)
+            with open(file, "rb") as audio_file:
+                transcript = gateway.transcribe(audio_file.read(), os.path.basename(file))
+            record = {"index": index, "start": index * chunk_size * 60, "vtt": transcript}
+            write_atomic(record_path, json.dumps(record))
+        transcripts.append(record["vtt"])
+        yield index + 1, total
+    if not os.path.exists(destination):
+        write_atomic(destination, "".join(transcripts))
+
+
+def is_transcript_complete(base_dir: str) -> bool:
+    return os.path.exists(get_audio_transcript_path(base_dir))
+
+
+def get_transcribed_chunk_count(base_dir: str) -> int:
+    return len(glob(f"{get_transcript_chunk_dir(base_dir)}/chunk_*.json"))
+
+
+INGESTION_STALE_AFTER = 30 * 60
+ingestion_threads = {}
+ingestion_lock = threading.Lock()
+
+
+def ingest_video(base_dir: str) -> None:
+    """
+    Transcribe a video and build its playback proxy, recording progress in
+    meta.json. Runs in a background thread, so it must not touch Streamlit.
+    """
+    try:
+        source = get_video_path(base_dir)
+        chunks_dir = get_audio_chunk_dir(base_dir)
+        for done, total in transcribe_chunks_progressively(base_dir, source, chunks_dir):
+            update_metadata(
+                base_dir,
+                ingestion="running",
+                ingestion_updated=time.time(),
+                chunks_done=done,
+                chunks_total=total,
+            )
+    except Exception as e:
+        print("Ingestion Error:", e)
+        update_metadata(
+            base_dir,
+            ingestion="failed",
+            ingestion_updated=time.time(),
+            ingestion_error=str(e),
+        )
+        return
+    build_playback_proxy(base_dir)
+    update_metadata(base_dir, ingestion="done", ingestion_updated=time.time())
+
+
+def build_playback_proxy(base_dir: str) -> None:
+    """
+    Run `create_playback_proxy` and record the outcome as "proxy" in
+    meta.json. A failed proxy leaves the transcript usable; playback falls
+    back to the original video until the proxy is rebuilt.
+    """
+    update_metadata(base_dir, proxy="running")
+    try:
+        create_playback_proxy(base_dir)
+    except Exception as e:
+        print("Proxy Error:", e)
+        update_metadata(base_dir, proxy="failed", proxy_error=str(e))
+        return
+    update_metadata(base_dir, proxy="done", proxy_error=None)
+
+
+def start_ingestion(base_dir: str) -> None:
+    """
+    Start `ingest_video` in a background thread unless one is already
+    running for this video. The thread outlives the script run that
+    started it, so leaving the upload page does not stop ingestion.
+
+    A video that is already transcribed but has no playback proxy, either
+    because the encode failed or because it was ingested before proxies
+    existed, only gets its proxy built.
+    """
+    with ingestion_lock:
+        thread = ingestion_threads.get(base_dir)
+        if thread is not None and thread.is_alive():
+            return
+        if get_ingestion_status(base_dir) == "done":
+            if os.path.exists(get_proxy_path(base_dir)):
+                return
+            target = build_playback_proxy
+            update_metadata(base_dir, proxy="running")
+        else:
+            target = ingest_video
+            update_metadata(base_dir, ingestion="running", ingestion_updated=time.time())
+        thread = threading.Thread(target=target, args=(base_dir,), daemon=True)
+        ingestion_threads[base_dir] = thread
+        thread.start()
+
+
+def get_ingestion_status(base_dir: str) -> str | None:
+    """
+    Return "running", "done", "failed" or None if ingestion never started.
+
+    A "running" status whose last update is older than
+    `INGESTION_STALE_AFTER` belongs to a worker that died with the server
+    process and is reported as "failed".
+    """
+    metadata = get_metadata(base_dir)
+    status = metadata.get("ingestion")
+    if status is None and is_transcript_complete(base_dir):
+        return "done"
+    if status == "running":
+        thread = ingestion_threads.get(base_dir)
+        alive = thread is not None and thread.is_alive()
+        stale = time.time() - metadata.get("ingestion_updated", 0) > INGESTION_STALE_AFTER
+        if not alive and stale:
+            return "failed"
+    return status
+
+
+def get_proxy_status(base_dir: str) -> str | None:
+    """
+    Return "running", "done", "failed" or None if no proxy was ever built.
+    A "running" proxy without a live worker died with the server process.
+    """
+    if os.path.exists(get_proxy_path(base_dir)):
+        return "done"
+    status = get_metadata(base_dir).get("proxy")
+    if status == "running":
+        thread = ingestion_threads.get(base_dir)
+        if thread is None or not thread.is_alive():
+            return "failed"
+    if status == "done":
+        return None
+    return status
+
+
+def get_wav_duration(wav_bytes: bytes) -> float | None:
+    try:
+        with wave.open(io.BytesIO(wav_bytes)) as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+WHISPER_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+COMPRESSED_BITRATE = 24_000
+
+
+def fits_upload_limit(duration: float) -> bool:
+    # Leave 10% headroom for Ogg container overhead.
+    return duration * COMPRESSED_BITRATE / 8 <= WHISPER_MAX_UPLOAD_BYTES * 0.9
+
+
+def compress_audio(wav_bytes: bytes) -> bytes | None:
+    command = [
+        "ffmpeg", "-i", "pipe:0",
+        "-ac", "1", "-ar", "16000",
+        "-c:a", "libopus", "-b:a", str(COMPRESSED_BITRATE),
+        "-f", "ogg", "pipe:1",
+    ]
+    result = subprocess.run(
+        command, input=wav_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if result.returncode != 0 or not result.stdout:
+        print("Compression Error:", result.stderr.decode(errors="replace")[-500:])
+        return None
+    return result.stdout
+
+
+def transcribe_in_memory(wav_bytes: bytes, destination: str) -> dict | None:
+    """
+    Transcribe a recording without writing audio to disk.
+
+    Returns the elapsed time together with the recorded and uploaded sizes,
+    or None when the audio could not be compressed under the upload limit.
+    """
+    started = time.perf_counter()
+    compressed = compress_audio(wav_bytes)
+    if compressed is None or len(compressed) > WHISPER_MAX_UPLOAD_BYTES:
+        return None
+    transcript = gateway.transcribe(compressed, "echo.ogg")
+    write_atomic(destination, transcript)
+    return {
+        "elapsed": time.perf_counter() - started,
+        "wav_bytes": len(wav_bytes),
+        "upload_bytes": len(compressed),
+    }
 
 
 def parse_timestamp(ts: str) -> timedelta:
@@ -153,27 +575,56 @@ def parse_timestamp(ts: str) -> timedelta:
     )
 
 
+def iter_vtt_cues(text: str, offset: timedelta = timedelta(0)):
+    lines = text.strip().splitlines()
+    for i, line in enumerate(lines):
+        if "-->" in line:
+            start, end = line.split(" --> ")
+            caption = lines[i + 1] if i + 1 < len(lines) else ""
+            yield {
+                "start": parse_timestamp(start.strip()) + offset,
+                "end": parse_timestamp(end.strip()) + offset,
+                "text": caption.strip(),
+            }
+
+
 class VttTimestampOutputParser(BaseOutputParser):
+    """
+    Parse a combined transcript where each `WEBVTT` block is one audio chunk
+    of `chunk_size` minutes.
+    """
+
+    chunk_size: int = 10
+
     def parse(self, text: str) -> list[dict]:
-        lines = text.strip().splitlines()
+        chunks = [chunk for chunk in text.split("WEBVTT") if chunk.strip()]
         result = []
-        offset = timedelta(minutes=0)
-        for i, line in enumerate(lines):
-            if "-->" in line:
-                start, end = line.split(" --> ")
-                caption = lines[i + 1] if i + 1 < len(lines) else ""
-                result.append(
-                    {
-                        "start": parse_timestamp(start.strip()) + offset,
-                        "end": parse_timestamp(end.strip()) + offset,
-                        "text": caption.strip(),
-                    }
-                )
-            elif "WEBVTT" in line and i != 0:
-                offset += parse_timestamp(end.strip())
+        for i, chunk in enumerate(chunks):
+            offset = timedelta(minutes=i * self.chunk_size)
+            result.extend(iter_vtt_cues(chunk, offset))
         return result
 
 
+def iter_transcript_cues(base_dir: str):
+    """
+    Yield cues from the chunks transcribed so far, in playback order.
+
+    Videos ingested before per-chunk records existed fall back to the
+    combined transcript.
+    """
+    records = glob(f"{get_transcript_chunk_dir(base_dir)}/chunk_*.json")
+    if not records:
+        transcript_path = get_audio_transcript_path(base_dir)
+        if os.path.exists(transcript_path):
+            with open(transcript_path, "r") as f:
+                yield from VttTimestampOutputParser().parse(f.read())
+        return
+    for record_path in sorted(records, key=get_chunk_index):
+        with open(record_path, "r") as f:
+            record = json.loads(f.read())
+        yield from iter_vtt_cues(record["vtt"], timedelta(seconds=record["start"]))
+
+
 class VttOutputParser(BaseOutputParser):
     def parse(self, text: str) -> list[dict]:
         lines = text.strip().splitlines()
@@ -185,16 +636,183 @@ class VttOutputParser(BaseOutputParser):
         return " ".join(result)
 
 
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs",
+    "e.g", "i.e", "u.s", "u.k", "approx", "dept", "inc", "ltd", "co",
+}
+# Ordinary sentence-final words that only abbreviate before a number ("No. 5").
+NUMBER_ABBREVIATIONS = {"no"}
+
+
+def is_sentence_end(part: str, next_part: str | None) -> bool:
+    if not re.search(r"[.!?][\"')\]]*$", part):
+        return False
+    last_word = part.split()[-1].rstrip("\"')]")
+    if last_word.endswith("."):
+        word = last_word[:-1]
+        if word.lower() in ABBREVIATIONS:
+            return False
+        # Single-letter initials ("J. Doe"), but not the pronoun "I".
+        if re.fullmatch(r"[A-HJ-Z]", word):
+            return False
+        if word.lower() in NUMBER_ABBREVIATIONS and next_part and next_part[0].isdigit():
+            return False
+    return next_part is None or bool(re.match(r"[A-Z0-9\"'(\[]", next_part))
+
+
+def get_sentence_id(index: int, text: str) -> str:
+    # Several sentences can begin in the same cue and share a start time,
+    # so identity comes from position plus content.
+    digest = hashlib.sha1(text.encode()).hexdigest()[:12]
+    return f"{index}-{digest}"
+
+
+def segment_sentences(cues: list[dict]) -> list[dict]:
+    """
+    Rebuild sentences across cue boundaries.
+
+    Each sentence keeps the start of the cue it begins in, the end of the cue
+    it finishes in (both in seconds), the indices of its source cues and a
+    stable `id`. A
+    sentence only closes on end punctuation that is not an abbreviation and
+    is followed by a capitalised fragment.
+    """
+    parts = [
+        (i, part)
+        for i, cue in enumerate(cues)
+        for part in re.split(r"(?<=[.!?])\s+", cue["text"].strip())
+        if part
+    ]
+    sentences = []
+    fragments, cue_ids, start = [], [], None
+    for n, (i, part) in enumerate(parts):
+        if not fragments:
+            start = cues[i]["start"].total_seconds()
+        fragments.append(part)
+        if i not in cue_ids:
+            cue_ids.append(i)
+        next_part = parts[n + 1][1] if n + 1 < len(parts) else None
+        if is_sentence_end(part, next_part):
+            sentences.append(
+                {
+                    "text": " ".join(fragments),
+                    "start": start,
+                    "end": cues[i]["end"].total_seconds(),
+                    "cues": cue_ids,
+                }
+            )
+            fragments, cue_ids = [], []
+    if fragments:
+        sentences.append(
+            {
+                "text": " ".join(fragments),
+                "start": start,
+                "end": cues[-1]["end"].total_seconds(),
+                "cues": cue_ids,
+            }
+        )
+    for index, sentence in enumerate(sentences):
+        sentence["id"] = get_sentence_id(index, sentence["text"])
+    return sentences
+
+
+# Bump when segmentation changes so cached sentences.json files are rebuilt.
+SENTENCES_VERSION = 4
+
+
+def load_sentences(base_dir: str) -> list[dict]:
+    """
+    Return the sentences of a video's transcript, segmenting it at most once
+    per set of transcribed chunks.
+    """
+    sentences_path = get_sentences_path(base_dir)
+    transcribed_chunks = get_transcribed_chunk_count(base_dir)
+    if os.path.exists(sentences_path):
+        with open(sentences_path, "r") as f:
+            cached = json.loads(f.read())
+        if (
+            cached.get("version") == SENTENCES_VERSION
+            and cached["chunks"] == transcribed_chunks
+        ):
+            return cached["sentences"]
+    sentences = segment_sentences(list(iter_transcript_cues(base_dir)))
+    write_atomic(
+        sentences_path,
+        json.dumps(
+            {
+                "version": SENTENCES_VERSION,
+                "chunks": transcribed_chunks,
+                "sentences": sentences,
+            }
+        ),
+    )
+    return sentences
+
+
 def generate_video_id(length: int = 11) -> str:
     token = secrets.token_urlsafe(8)
     return token[:length]
 
 
+def generate_session_id() -> str:
+    return secrets.token_hex(8)
+
+
+def generate_attempt_id() -> str:
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return f"{timestamp}_{secrets.token_hex(4)}"
+
+
+def save_echo_voice(wav_bytes: bytes, attempt_dir: str, max_memory_bytes: int = 10 * 1024 * 1024):
+    """
+    Return a source for `cut_audio_in_chunks`.
+
+    Short recordings stay in memory; only long ones are spilled to the
+    attempt directory.
+    """
+    os.makedirs(attempt_dir, exist_ok=True)
+    if len(wav_bytes) <= max_memory_bytes:
+        return io.BytesIO(wav_bytes)
+    echo_voice_path = get_echo_voice_path(attempt_dir)
+    with open(echo_voice_path, "wb") as voice:
+        voice.write(wav_bytes)
+    return echo_voice_path
+
+
+def cleanup_attempts(
+    base_dir: str, session_id: str, retention: timedelta = timedelta(days=1)
+) -> None:
+    """
+    Remove attempts older than `retention` from other sessions.
+
+    Every session runs this, so files may disappear underneath us; those
+    errors are ignored. Session directories are only removed once they are
+    both empty and stale, so a session that is creating its first attempt
+    never loses its parent directory.
+    """
+    cutoff = (datetime.now() - retention).timestamp()
+    attempts_dir = get_attempts_dir(base_dir)
+    for session_dir in glob(f"{attempts_dir}/*"):
+        if os.path.basename(session_dir) == session_id:
+            continue
+        for attempt_dir in glob(f"{session_dir}/*"):
+            try:
+                if os.path.getmtime(attempt_dir) < cutoff:
+                    shutil.rmtree(attempt_dir, ignore_errors=True)
+            except OSError:
+                continue
+        try:
+            if os.path.getmtime(session_dir) < cutoff and not os.listdir(session_dir):
+                os.rmdir(session_dir)
+        except OSError:
+            continue
+
+
 def move_to_permenent_dir(video_name: str, base_dir: str) -> None:
     tmp_path = get_tmp_path(video_name)
-    os.makedirs(base_dir, exist_ok=True)
+    os.makedirs(f"{base_dir}/media", exist_ok=True)
     title, ext = video_name.split(".")
-    video_path = f"{base_dir}/video.{ext}"
+    video_path = f"{base_dir}/media/video.{ext}"
     if not os.path.exists(video_path):
         command = ["mv", tmp_path, video_path]
         subprocess.run(command)
@@ -203,61 +821,148 @@ def move_to_permenent_dir(video_name: str, base_dir: str) -> None:
             f.write(metadata)
 
 
-def get_dialog(base_dir: str) -> tuple[str, str]:
-    audio_path = get_audio_transcript_path(base_dir)
-    echo_path = get_echo_transcript_path(base_dir)
+def normalize_sentence(sentence: str) -> str:
+    return re.sub(r"[.!?,]", "", sentence.lower()).strip()
+
+
+def get_sentences_in_range(base_dir: str, start: float | None, end: float | None) -> list[dict]:
+    """
+    Return the sentences overlapping `start`..`end` seconds; a missing bound
+    leaves that side open.
+    """
+    return [
+        sentence
+        for sentence in load_sentences(base_dir)
+        if (start is None or sentence["end"] > start)
+        and (end is None or sentence["start"] < end)
+    ]
+
 
-    audio_loader = TextLoader(audio_path)
+def parse_shadow_sentences(content: str, length: int) -> list[str]:
+    shadow_dialog = json.loads(content)["shadow_sentences"]
+    if not isinstance(shadow_dialog, list):
+        raise ValueError("shadow_sentences is not a list")
+    if len(shadow_dialog) != length:
+        raise ValueError(
+            f"expected {length} shadow sentences, got {len(shadow_dialog)}"
+        )
+    return [str(sentence) for sentence in shadow_dialog]
+
+
+def get_dialog(
+    sentences: list[dict], attempt_dir: str, max_tries: int = 3
+) -> tuple[list[str], list[str]]:
+    echo_path = get_echo_transcript_path(attempt_dir)
     echo_loader = TextLoader(echo_path)
-    audio_docs = audio_loader.load()
     echo_docs = echo_loader.load()
-    audio_text = audio_docs[0].page_content
     echo_text = echo_docs[0].page_content
 
     parser = VttOutputParser()
-    audio_dialog = re.sub(r"[.!?,]", "", parser.parse(audio_text).lower())
-    echo_dialog = re.sub(r"[.!?,]", "", parser.parse(echo_text).lower())
+    audio_dialog = [sentence["text"] for sentence in sentences]
+    echo_dialog = normalize_sentence(parser.parse(echo_text))
+    if not audio_dialog:
+        return [], []
 
-    llm = ChatOpenAI(temperature=0.1, model="gpt-4o-mini")
     prompt = PromptTemplate.from_template(
         """
-        You will receive two texts: the original script and the shadowed version spoken by a learner.
+        You will receive the original script as a JSON list of sentences and the shadowed version spoken by a learner as plain text.
 
-        Your task is to split both texts into lists of sentences and align them positionally.
+        Your task is to split the shadowed version into sentences aligned positionally with the original list.
 
         Important constraints:
-        - The two lists **must be exactly the same length**, as they will be compared using Word Error Rate (WER).
+        - The shadow list **must be exactly the same length** as the original list, as they will be compared using Word Error Rate (WER).
         - If a sentence from the original script is missing or skipped in the shadowed version, insert an empty string ("") at the correct position in the shadow list.
-        - Do not merge, rephrase, or split sentences arbitrarily. Keep the original sentences exactly as they are.
+        - Do not rephrase the shadowed words. Keep them exactly as they are.
         - Maintain the order of the original script.
 
         Return only valid JSON with the following format:
         {{
-        "original_sentences": [ ... ],
         "shadow_sentences": [ ... ]
         }}
 
         Do not include any explanations, markdown, or code blocks—return only the raw JSON.
 
-        Original script:
+        Original sentences:
         {audio}
 
         Shadowed version:
         {echo}
         """
     )
-    chain = prompt | llm
-    response = chain.invoke({"audio": audio_dialog, "echo": echo_dialog})
-    result = json.loads(response.content)
-    return result["original_sentences"], result["shadow_sentences"]
+    # A reply of the wrong length would shift every later sentence onto the
+    # wrong reference, so it is rejected (and never cached) and asked again.
+    for attempt in range(max_tries):
+        try:
+            shadow_dialog = gateway.chat(
+                prompt,
+                {"audio": json.dumps(audio_dialog), "echo": echo_dialog},
+                model="gpt-4o-mini",
+                temperature=0.1,
+                parse=lambda content: parse_shadow_sentences(content, len(audio_dialog)),
+            )
+            return audio_dialog, shadow_dialog
+        except ValueError:
+            if attempt == max_tries - 1:
+                raise
+
+
+def load_shadow_result(attempt_dir: str) -> dict | None:
+    result_path = get_shadow_result_path(attempt_dir)
+    if not os.path.exists(result_path):
+        return None
+    with open(result_path, "r") as f:
+        return json.loads(f.read())
+
+
+def save_shadow_result(attempt_dir: str, result: dict) -> None:
+    result_path = get_shadow_result_path(attempt_dir)
+    write_atomic(result_path, json.dumps(result))
 
 
 def dialog_to_text(dialog: list[str]) -> str:
     return "\n\n".join(dialog)
 
 
+def get_sentence_scores(sentences: list[dict], echo_dialog: list[str]) -> list[dict]:
+    """
+    Score each sentence the learner actually spoke, listing which reference
+    words they hit and missed according to the WER alignment.
+    """
+    scores = []
+    for sentence, hyp in zip(sentences, echo_dialog):
+        ref, hyp = normalize_sentence(sentence["text"]), normalize_sentence(hyp)
+        if not ref or not hyp:
+            continue
+        output = process_words(ref, hyp)
+        ref_words = output.references[0]
+        hit, missed = [], []
+        for chunk in output.alignments[0]:
+            words = ref_words[chunk.ref_start_idx:chunk.ref_end_idx]
+            if chunk.type == "equal":
+                hit.extend(words)
+            elif chunk.type in ("substitute", "delete"):
+                missed.extend(words)
+        scores.append(
+            {
+                "id": sentence["id"],
+                "start": sentence["start"],
+                "text": sentence["text"],
+                "score": max(0.0, 1.0 - output.wer),
+                "hit": hit,
+                "missed": missed,
+            }
+        )
+    return scores
+
+
 def get_correction_rate(audio_dialog: list[str], echo_dialog: list[str]) -> str:
     correction_rates = []
     for ref, hyp in zip(audio_dialog, echo_dialog):
-        correction_rates.append(1.0 - wer(ref, hyp))
+        ref, hyp = normalize_sentence(ref), normalize_sentence(hyp)
+        # Sentences the learner never spoke are not part of the attempt,
+        # matching what `get_sentence_scores` stores.
+        if ref and hyp:
+            correction_rates.append(1.0 - wer(ref, hyp))
+    if not correction_rates:
+        return f"{0:.2%}"
     return f"{sum(correction_rates) / len(correction_rates):.2%}"
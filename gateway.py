@@ -0,0 +1,248 @@
+import contextlib
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Callable
+
+import httpx
+import openai
+import tiktoken
+from langchain_core.prompts import BasePromptTemplate
+from langchain_openai import ChatOpenAI
+
+MAX_RETRIES = 5
+CACHE_PATH = ".cache/gateway.sqlite"
+CACHE_TTL = 30 * 24 * 60 * 60
+CACHE_MAX_ENTRIES = 10_000
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: int = 1) -> None:
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+buckets = {}
+bucket_lock = threading.Lock()
+
+
+def get_bucket(env_var: str, default: int) -> TokenBucket:
+    """
+    Create the bucket on first use rather than at import, so limits from a
+    .env loaded after this module is imported are honoured.
+    """
+    with bucket_lock:
+        if env_var not in buckets:
+            buckets[env_var] = TokenBucket(int(os.getenv(env_var, default)))
+        return buckets[env_var]
+
+
+def get_request_bucket() -> TokenBucket:
+    return get_bucket("OPENAI_REQUESTS_PER_MINUTE", 500)
+
+
+def get_token_bucket() -> TokenBucket:
+    return get_bucket("OPENAI_TOKENS_PER_MINUTE", 200_000)
+
+
+@lru_cache
+def get_http_client() -> httpx.Client:
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    return httpx.Client(limits=limits, timeout=httpx.Timeout(120.0, connect=10.0))
+
+
+@lru_cache
+def get_openai_client() -> openai.OpenAI:
+    return openai.OpenAI(http_client=get_http_client(), max_retries=0)
+
+
+@lru_cache
+def get_chat_model(model: str, temperature: float) -> ChatOpenAI:
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        http_client=get_http_client(),
+        max_retries=0,
+    )
+
+
+def count_tokens(model: str, text: str) -> int:
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return len(encoding.encode(text))
+
+
+def with_retry(func, *args, **kwargs):
+    for attempt in range(MAX_RETRIES):
+        try:
+            return func(*args, **kwargs)
+        except RETRYABLE_ERRORS:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(random.uniform(0, min(60, 2**attempt)))
+
+
+def get_cache_key(model: str, prompt: str, data: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (model.encode(), prompt.encode(), data):
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+@lru_cache
+def init_cache() -> None:
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    with contextlib.closing(sqlite3.connect(CACHE_PATH, timeout=30)) as connection:
+        with connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+
+
+@contextlib.contextmanager
+def connect_cache():
+    """
+    Yield a cache connection inside a transaction and close it afterwards;
+    `sqlite3.Connection` as a context manager only commits.
+    """
+    init_cache()
+    with contextlib.closing(sqlite3.connect(CACHE_PATH, timeout=30)) as connection:
+        with connection:
+            yield connection
+
+
+def cache_get(key: str) -> str | None:
+    now = time.time()
+    with connect_cache() as connection:
+        row = connection.execute(
+            "SELECT value, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if now - created > CACHE_TTL:
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        connection.execute(
+            "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+        )
+    return json.loads(value)
+
+
+def cache_set(key: str, value: str) -> None:
+    now = time.time()
+    with connect_cache() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now),
+        )
+        connection.execute(
+            "DELETE FROM responses WHERE created < ?", (now - CACHE_TTL,)
+        )
+        connection.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (CACHE_MAX_ENTRIES,),
+        )
+
+
+def cache_delete(key: str) -> None:
+    with connect_cache() as connection:
+        connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+
+def transcribe(audio_bytes: bytes, file_name: str, model: str = "whisper-1") -> str:
+    key = get_cache_key(model, "vtt:en", audio_bytes)
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    def request() -> str:
+        get_request_bucket().acquire()
+        return get_openai_client().audio.transcriptions.create(
+            model=model,
+            file=(file_name, audio_bytes),
+            response_format="vtt",
+            language="en",
+        )
+
+    transcript = with_retry(request)
+    cache_set(key, transcript)
+    return transcript
+
+
+def chat(
+    prompt: BasePromptTemplate,
+    inputs: dict,
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.1,
+    parse: Callable[[str], object] = lambda content: content,
+):
+    """
+    Return `parse(content)` of the model's reply.
+
+    A response is only cached once `parse` accepts it; `parse` should raise
+    to reject a reply, and a cached reply it rejects is dropped and fetched
+    again.
+    """
+    prompt_value = prompt.invoke(inputs)
+    prompt_text = prompt_value.to_string()
+    key = get_cache_key(f"{model}@{temperature}", prompt_text, b"")
+    cached = cache_get(key)
+    if cached is not None:
+        try:
+            return parse(cached)
+        except Exception:
+            cache_delete(key)
+
+    def request() -> str:
+        get_request_bucket().acquire()
+        get_token_bucket().acquire(count_tokens(model, prompt_text))
+        return get_chat_model(model, temperature).invoke(prompt_value).content
+
+    content = with_retry(request)
+    result = parse(content)
+    cache_set(key, content)
+    return result
@@ -4,51 +4,55 @@ from functions import *
 video_types = ["mp4", "avi", "mov", "webm"]
 
 
+def show_ingestion_progress(state, base_dir: str) -> None:
+    while (status := get_ingestion_status(base_dir)) == "running":
+        metadata = get_metadata(base_dir)
+        done, total = metadata.get("chunks_done", 0), metadata.get("chunks_total")
+        if total is None or done < total:
+            state.update(
+                label=f"Transcribe chunks ({done}/{total or '?'}) ... "
+                "Transcribed parts are already available on the shadowing page."
+            )
+        else:
+            state.update(label="Create playback proxy ...")
+        time.sleep(2)
+    if status == "failed":
+        state.update(label="Failed to transcribe the video.", state="error")
+    elif get_proxy_status(base_dir) == "failed":
+        state.update(
+            label="Transcribed, but the playback proxy failed. "
+            "You can rebuild it on the shadowing page.",
+            state="complete",
+        )
+    else:
+        state.update(label="Done!", state="complete")
+
+
 def transcribe_youtube_video(url: str) -> None:
     with st.status("Downloading video ...") as state:
         download_youtube_video(url)
-
-        state.update(label="Extract audio from video ...")
         video_id = get_video_id(url)
         base_dir = get_base_dir(video_id)
-        extract_audio_from_video(base_dir)
-
-        state.update(label="Cut audio in chunks ...")
-        source = get_audio_path(base_dir)
-        chunks_dir = get_audio_chunk_dir(base_dir)
-        cut_audio_in_chunks(source, chunks_dir)
-
-        state.update(label="Transcribe chunks ...")
-        destination = get_audio_transcript_path(base_dir)
-        transcribe_chunks(base_dir, chunks_dir, destination)
-
-        state.update(label="Done!")
+        start_ingestion(base_dir)
+        show_ingestion_progress(state, base_dir)
 
 
 def transcribe_uploaded_video(video) -> None:
     with st.status("Loading video ...") as state:
-        video_content = video.read()
-        tmp_path = get_tmp_path(video.name)
-        with open(tmp_path, "wb") as f:
-            f.write(video_content)
-        video_id = generate_video_id()
-        move_to_permenent_dir(video.name, video_id)
-
-        state.update(label="Extract audio from video ...")
-        base_dir = get_base_dir(video_id)
-        extract_audio_from_video(base_dir)
-
-        state.update(label="Cut audio in chunks ...")
-        source = get_audio_path(base_dir)
-        destination = get_audio_chunk_dir(base_dir)
-        cut_audio_in_chunks(source, destination)
-
-        state.update(label="Transcribe chunks ...")
-        chunks_dir = get_audio_chunk_dir(base_dir)
-        destination = get_audio_transcript_path(base_dir)
-        transcribe_chunks(base_dir, chunks_dir, destination)
-
-        state.update(label="Done!")
+        # The uploader keeps its file across reruns, so remember which video
+        # each upload became instead of ingesting it again.
+        uploaded_videos = st.session_state.setdefault("uploaded_videos", {})
+        if video.file_id not in uploaded_videos:
+            video_content = video.read()
+            tmp_path = get_tmp_path(video.name)
+            with open(tmp_path, "wb") as f:
+                f.write(video_content)
+            video_id = generate_video_id()
+            move_to_permenent_dir(video.name, get_base_dir(video_id))
+            uploaded_videos[video.file_id] = video_id
+        base_dir = get_base_dir(uploaded_videos[video.file_id])
+        start_ingestion(base_dir)
+        show_ingestion_progress(state, base_dir)
 
 
 title = "Upload video"
@@ -1,16 +1,14 @@
 import streamlit as st
+from streamlit_autorefresh import st_autorefresh
 from functions import *
-from langchain.document_loaders import TextLoader
+import progress
 
 
 @st.cache_data(show_spinner="Loading text ...")
-def load_text(base_dir: str) -> list[dict]:
-    transcript_path = get_audio_transcript_path(base_dir)
-    loader = TextLoader(transcript_path)
-    docs = loader.load()
-    text = docs[0].page_content
-    parser = VttTimestampOutputParser()
-    return parser.parse(text)
+def load_text(base_dir: str, transcribed_chunks: int) -> list[dict]:
+    # `transcribed_chunks` is part of the cache key, so newly finished
+    # chunks invalidate the cached captions while ingestion is running.
+    return load_sentences(base_dir)
 
 
 def select_video(video_ids: list[str]) -> tuple[str, str]:
@@ -34,6 +32,7 @@ def select_video(video_ids: list[str]) -> tuple[str, str]:
                 "video_name": video_name,
                 "transcribe": False,
                 "score": False,
+                "attempt_id": None,
             }
         )
     video_id = video_name_map[video_name]
@@ -42,31 +41,85 @@ def select_video(video_ids: list[str]) -> tuple[str, str]:
     return base_dir, video_path
 
 
-def transcribe_echo_voice(wav_audio_data, base_dir):
+def get_current_attempt_dir(base_dir: str) -> str:
+    return get_attempt_dir(
+        base_dir, st.session_state["session_id"], st.session_state["attempt_id"]
+    )
+
+
+def get_looped_range() -> tuple[float | None, float | None]:
+    """
+    Return the looped caption's range in seconds, or the whole video from
+    the current start time when nothing is looped.
+    """
+    start_time = st.session_state["start_time"]
+    end_time = st.session_state["end_time"]
+    start = start_time.total_seconds() if isinstance(start_time, timedelta) else start_time
+    if not st.session_state["loop"] or end_time is None:
+        return start or None, None
+    return start, end_time.total_seconds()
+
+
+def transcribe_echo_voice(wav_audio_data, base_dir, chunk_minutes: int = 10):
     with st.status("Loading audio ...") as state:
+        cleanup_attempts(base_dir, st.session_state["session_id"])
+        st.session_state["attempt_id"] = generate_attempt_id()
+        st.session_state["attempt_range"] = get_looped_range()
+        attempt_dir = get_current_attempt_dir(base_dir)
         wav_bytes = wav_audio_data.read()
-        echo_voice_path = get_echo_voice_path(base_dir)
-        with open(echo_voice_path, "wb") as voice:
-            voice.write(wav_bytes)
+        destination = get_echo_transcript_path(attempt_dir)
+        duration = get_wav_duration(wav_bytes)
+
+        if duration is not None and fits_upload_limit(duration):
+            state.update(label="Transcribing audio ...")
+            stats = transcribe_in_memory(wav_bytes, destination)
+            st.session_state["echo_stats"] = stats
+            if stats is not None:
+                state.update(label="Done!")
+                return
+        else:
+            st.session_state["echo_stats"] = None
+
+        source = save_echo_voice(wav_bytes, attempt_dir)
 
         state.update(label="Splitting audio in chunks ...")
-        chunks_dir = get_echo_chunk_dir(base_dir)
-        cut_audio_in_chunks(echo_voice_path, chunks_dir)
+        chunks_dir = get_echo_chunk_dir(attempt_dir)
+        cut_audio_in_chunks(source, chunks_dir, chunk_minutes)
 
         state.update(label="Transcribing audio chunks ...")
-        destination = get_echo_transcript_path(base_dir)
         transcribe_chunks(base_dir, chunks_dir, destination)
 
         state.update(label="Done!")
 
 
 def get_shadow_result(base_dir: str) -> str:
-    with st.status("Transcribeing speech to text ...") as state:
-        audio_dialog, echo_dialog = get_dialog(base_dir)
-        state.update(label="Compare each speeches ...")
-        correction_rate = get_correction_rate(audio_dialog, echo_dialog)
-        state.update(label="Done!")
-    return f"Your speech accuracy: {correction_rate}", audio_dialog, echo_dialog
+    attempt_dir = get_current_attempt_dir(base_dir)
+    result = load_shadow_result(attempt_dir)
+    if result is None:
+        with st.status("Transcribeing speech to text ...") as state:
+            start, end = st.session_state["attempt_range"]
+            sentences = get_sentences_in_range(base_dir, start, end)
+            audio_dialog, echo_dialog = get_dialog(sentences, attempt_dir)
+            state.update(label="Compare each speeches ...")
+            correction_rate = get_correction_rate(audio_dialog, echo_dialog)
+            progress.record_shadow_scores(
+                st.session_state["learner"],
+                os.path.basename(base_dir),
+                st.session_state["attempt_id"],
+                get_sentence_scores(sentences, echo_dialog),
+            )
+            result = {
+                "correction_rate": correction_rate,
+                "audio_dialog": audio_dialog,
+                "echo_dialog": echo_dialog,
+            }
+            save_shadow_result(attempt_dir, result)
+            state.update(label="Done!")
+    return (
+        f"Your speech accuracy: {result['correction_rate']}",
+        result["audio_dialog"],
+        result["echo_dialog"],
+    )
 
 
 title = "Mocking bird"
@@ -86,21 +139,48 @@ if "initial" not in st.session_state:
             "record": False,
             "video_name": None,
             "transcribe": False,
+            "session_id": generate_session_id(),
+            "attempt_id": None,
         }
     )
 
+st.session_state["learner"] = st.sidebar.text_input(
+    "Learner name", st.session_state.get("learner", "guest")
+)
+
 video_ids = get_video_ids()
 if get_video_names(video_ids) == []:
     st.write("### You need to upload the video first!")
 else:
     base_dir, video_path = select_video(video_ids)
 
-    st.video(
-        video_path,
-        start_time=st.session_state["start_time"],
-        end_time=st.session_state["end_time"] if st.session_state["loop"] else None,
-        loop=st.session_state["loop"],
-    )
+    start_time = st.session_state["start_time"]
+    end_time = st.session_state["end_time"]
+    if st.session_state["loop"] and end_time is not None:
+        clip_path = get_cue_clip(base_dir, start_time, end_time)
+        if clip_path:
+            st.video(clip_path, loop=True)
+        else:
+            st.video(
+                get_playback_path(base_dir),
+                start_time=start_time,
+                end_time=end_time,
+                loop=True,
+            )
+    else:
+        st.video(get_playback_path(base_dir), start_time=start_time)
+
+    if get_ingestion_status(base_dir) == "done":
+        proxy_status = get_proxy_status(base_dir)
+        if proxy_status == "running":
+            st.info("Building a lighter playback copy of this video ...")
+            st_autorefresh(interval=15000, key="proxy_refresh")
+        elif proxy_status != "done":
+            if proxy_status == "failed":
+                st.warning("Could not build the playback copy; playing the original video.")
+            if st.button("Build playback proxy"):
+                start_ingestion(base_dir)
+                st.rerun()
 
     repeat_column, caption_column, record_column = st.columns(3)
     with repeat_column:
@@ -115,13 +195,29 @@ else:
         st.rerun()
 
     if caption:
+        transcribed_chunks = get_transcribed_chunk_count(base_dir)
+        if not is_transcript_complete(base_dir):
+            ingestion_status = get_ingestion_status(base_dir)
+            if ingestion_status == "running":
+                st.info(
+                    f"Still transcribing: captions for the first "
+                    f"{transcribed_chunks * 10} minutes are ready."
+                )
+                st_autorefresh(interval=15000, key="transcript_refresh")
+            elif ingestion_status == "failed":
+                st.warning(
+                    f"Transcription stopped after {transcribed_chunks * 10} minutes."
+                )
+                if st.button("Resume transcription"):
+                    start_ingestion(base_dir)
+                    st.rerun()
         with st.container(border=True, height=200):
-            captions = load_text(base_dir)
-            for caption in captions:
-                button = st.button(caption["text"], key=caption["start"])
+            captions = load_text(base_dir, transcribed_chunks)
+            for i, caption in enumerate(captions):
+                button = st.button(caption["text"], key=f"sentence_{i}")
                 if button:
-                    st.session_state["start_time"] = caption["start"]
-                    st.session_state["end_time"] = caption["end"]
+                    st.session_state["start_time"] = timedelta(seconds=caption["start"])
+                    st.session_state["end_time"] = timedelta(seconds=caption["end"])
                     st.rerun()
 
     if record:
@@ -134,6 +230,14 @@ else:
                     transcribe_echo_voice(wav_audio_data, base_dir)
                     st.rerun()
             elif st.session_state["score"] == False:
+                stats = st.session_state.get("echo_stats")
+                if stats:
+                    st.caption(
+                        f"Transcribed in memory in {stats['elapsed']:.1f}s: "
+                        f"uploaded {stats['upload_bytes'] // 1024} KB instead of "
+                        f"{stats['wav_bytes'] // 1024} KB, skipping the chunk "
+                        "export and disk round-trips."
+                    )
                 score_button = st.button(
                     "Recording complete! Check your score!", key="score_button"
                 )
@@ -162,6 +266,7 @@ else:
                         {
                             "transcribe": False,
                             "score": False,
+                            "attempt_id": None,
                         }
                     )
                     st.rerun()
@@ -2,21 +2,19 @@
 
 import streamlit as st
 import os
-import openai
-import random
 import re
 import pyttsx3
 from dotenv import load_dotenv
-from langchain.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain.chains import LLMChain
+import gateway
+import progress
 from functions import (
     get_video_ids, get_video_names,
     get_video_name_map, get_base_dir,
-    get_audio_transcript_path,
+    load_sentences, get_transcribed_chunk_count,
+    get_cue_clip, get_playback_path,
 )
+from datetime import timedelta
 
 
 # ✅ 파일 경로 내 특수문자 제거
@@ -24,17 +22,16 @@ def change_path(path: str) -> str:
     return re.sub(r'[<>:"/\\|?*&=]', '_', path)
 
 
-# ✅ LLM 환경 설정 및 모델 로딩
+# ✅ 환경 설정
 def setup_environment():
     load_dotenv()
     st.set_page_config(page_title="Video Quiz Generator", page_icon="🎬")
     st.title("🎬 영상 자막 기반 영어 퀴즈 생성기")
-    return ChatOpenAI(model_name="gpt-4o-mini", temperature=0.2)
 
 
-# ✅ 퀴즈 생성용 프롬프트 체인 설정
-def setup_quiz_chain(llm):
-    quiz_prompt = ChatPromptTemplate.from_messages([
+# ✅ 퀴즈 생성용 프롬프트 설정
+def setup_quiz_prompt():
+    return ChatPromptTemplate.from_messages([
         ("system", "You are an English teacher."),
         ("human", """
 From the sentence below, make ONE multiple-choice fill-in-the-blank English quiz question.
@@ -56,26 +53,21 @@ D) gone
 Sentence: {sentence}
 """)
     ])
-    return LLMChain(llm=llm, prompt=quiz_prompt)
 
 
 # ✅ 자막 파일 로딩 및 문장 추출 (캐시 포함)
+# 전사가 진행 중이면 완료된 청크 수가 바뀌면서 캐시가 갱신됩니다
 @st.cache_resource(show_spinner="📚 문장 추출 중...")
-def extract_sentences_cached(file_path):
-    return extract_sentences(file_path)
-
-def extract_sentences(file_path):
-    loader = TextLoader(file_path)
-    documents = loader.load()
-    splitter = RecursiveCharacterTextSplitter(separators=[".", "!", "?"], chunk_size=200)
-    docs = splitter.split_documents(documents)
+def extract_sentences_cached(base_dir, transcribed_chunks):
+    return extract_sentences(base_dir)
+
+def extract_sentences(base_dir):
     # 최소 5단어 이상 문장만 필터링
-    sentences = [doc.page_content.strip() for doc in docs if len(doc.page_content.split()) > 4]
-    return random.sample(sentences, min(20, len(sentences)))
+    return [s for s in load_sentences(base_dir) if len(s["text"].split()) > 4]
 
 
 # ✅ 문장 리스트를 기반으로 퀴즈 생성
-def generate_quiz(quiz_chain, sentences, num_questions):
+def generate_quiz(quiz_prompt, sentences, num_questions):
     quiz_data = []
     sentence_idx, attempts = 0, 0
 
@@ -86,8 +78,16 @@ def generate_quiz(quiz_chain, sentences, num_questions):
             s = sentences[sentence_idx]
             sentence_idx += 1
 
-            result = quiz_chain.run({"sentence": s})
-            parsed = parse_question_block(result)
+            try:
+                parsed = gateway.chat(
+                    quiz_prompt,
+                    {"sentence": s["text"]},
+                    model="gpt-4o-mini",
+                    temperature=0.2,
+                    parse=parse_quiz_response,
+                )
+            except ValueError:
+                parsed = None
             if parsed:
                 parsed["source_sentence"] = s
                 quiz_data.append(parsed)
@@ -97,7 +97,7 @@ def generate_quiz(quiz_chain, sentences, num_questions):
 
 
 # ✅ 퀴즈 UI 출력
-def display_quiz_ui(quiz_data):
+def display_quiz_ui(quiz_data, base_dir):
     st.subheader("📝 퀴즈 풀기")
     user_answers = {}
 
@@ -109,17 +109,27 @@ def display_quiz_ui(quiz_data):
         submitted = st.form_submit_button("✅ 제출")
 
     if submitted:
-        show_results(quiz_data, user_answers)
+        show_results(quiz_data, user_answers, base_dir)
 
 
 # ✅ 정답 채점 및 결과 출력
-def show_results(quiz_data, user_answers):
+def show_results(quiz_data, user_answers, base_dir):
     st.markdown("📊 채점 결과")
     score = 0
 
+    learner_id = st.session_state.get("learner", "guest")
+    video_id = os.path.basename(base_dir)
+    # 같은 퀴즈를 다시 제출해도 답안은 한 번만 기록
+    record = not st.session_state.get("quiz_recorded", False)
+    st.session_state.quiz_recorded = True
+
     for idx, q in enumerate(quiz_data):
         user_ans = user_answers.get(idx)
         correct_ans = q["options"][q["answer"]]
+        if record:
+            progress.record_quiz_answer(
+                learner_id, video_id, q["source_sentence"], correct_ans, user_ans == correct_ans
+            )
 
         with st.container():
             st.markdown(f"**Q{idx + 1}. {q['question']}**")
@@ -128,11 +138,25 @@ def show_results(quiz_data, user_answers):
                 score += 1
             else:
                 st.error(f"❌ 오답입니다. 선택: **{user_ans}**, 정답: **{correct_ans}**")
+            show_source_moment(q["source_sentence"], base_dir)
         st.markdown("---")
 
     st.info(f"🎉 최종 점수: {score} / {len(quiz_data)}")
 
 
+# ✅ 문제의 원본 문장이 나오는 영상 구간 재생
+def show_source_moment(sentence, base_dir):
+    start = timedelta(seconds=sentence["start"])
+    end = timedelta(seconds=sentence["end"])
+    with st.expander(f"🎬 원본 문장 보기 ({start} ~ {end})"):
+        st.write(sentence["text"])
+        clip_path = get_cue_clip(base_dir, start, end)
+        if clip_path:
+            st.video(clip_path)
+        else:
+            st.video(get_playback_path(base_dir), start_time=start, end_time=end)
+
+
 # ✅ GPT 응답 파싱 → 퀴즈 형식으로
 def parse_question_block(text):
     try:
@@ -153,6 +177,14 @@ def parse_question_block(text):
         return None
 
 
+# ✅ 파싱에 실패한 응답은 캐시되지 않도록 예외 발생
+def parse_quiz_response(text):
+    parsed = parse_question_block(text)
+    if parsed is None:
+        raise ValueError("Invalid quiz question")
+    return parsed
+
+
 # ✅ 보기 옵션 추출 및 정답 인덱스 탐지
 def extract_options(text):
     options, correct_index = [], None
@@ -171,8 +203,11 @@ def extract_options(text):
 
 # ✅ Streamlit 메인 실행
 def main():
-    llm = setup_environment()
-    quiz_chain = setup_quiz_chain(llm)
+    setup_environment()
+    quiz_prompt = setup_quiz_prompt()
+    st.session_state["learner"] = st.sidebar.text_input(
+        "Learner name", st.session_state.get("learner", "guest")
+    )
 
     video_ids = get_video_ids()
     video_names = get_video_names(video_ids)
@@ -185,10 +220,10 @@ def main():
     selected_video = st.selectbox("🎥 퀴즈를 풀 영상 선택", video_names)
     video_id = video_name_map[selected_video]
     base_dir = get_base_dir(video_id)
-    transcript_path = get_audio_transcript_path(base_dir)
+    transcribed_chunks = get_transcribed_chunk_count(base_dir)
 
     try:
-        sentences = extract_sentences_cached(transcript_path)
+        sentences = extract_sentences_cached(base_dir, transcribed_chunks)
     except Exception as e:
         st.error(f"❌ 자막 파일을 불러오는 중 오류 발생: {e}")
         return
@@ -201,9 +236,14 @@ def main():
     st.write(f"총 {num_questions}문제를 생성합니다.")
 
     if st.button("🧩 퀴즈 만들기"):
-        quiz_data = generate_quiz(quiz_chain, sentences, num_questions)
+        candidates = progress.select_review_sentences(
+            st.session_state["learner"], video_id, sentences, 20
+        )
+        quiz_data = generate_quiz(quiz_prompt, candidates, num_questions)
         if quiz_data:
             st.session_state.quiz_data = quiz_data
+            st.session_state.quiz_base_dir = base_dir
+            st.session_state.quiz_recorded = False
             st.session_state.quiz_ready = True
         else:
             st.session_state.quiz_ready = False
@@ -211,7 +251,7 @@ def main():
 
     # ✅ 퀴즈가 준비된 경우에만 출력 (여기서만 출력!)
     if st.session_state.get("quiz_ready", False):
-        display_quiz_ui(st.session_state.quiz_data)
+        display_quiz_ui(st.session_state.quiz_data, st.session_state.quiz_base_dir)
 
 
 
@@ -0,0 +1,60 @@
+import streamlit as st
+import pandas as pd
+import progress
+from functions import get_video_ids, get_video_name
+
+title = "Progress"
+st.set_page_config(
+    page_icon="📈",
+    page_title=title,
+)
+st.title(title)
+
+learner_id = st.sidebar.text_input(
+    "Learner name", st.session_state.get("learner", "guest")
+)
+st.session_state["learner"] = learner_id
+
+summary = progress.get_learner_summary(learner_id)
+if summary is None:
+    st.write("### Take a quiz or shadow a video first!")
+else:
+    quiz = summary["kinds"].get("quiz", {"attempts": 0, "accuracy": 0})
+    shadow = summary["kinds"].get("shadow", {"attempts": 0, "accuracy": 0})
+    answers_column, quiz_column, sentences_column, shadow_column = st.columns(4)
+    answers_column.metric("Quiz answers", quiz["attempts"])
+    quiz_column.metric("Quiz accuracy", f"{quiz['accuracy']:.2%}")
+    sentences_column.metric("Shadowed sentences", shadow["attempts"])
+    shadow_column.metric("Shadowing score", f"{shadow['accuracy']:.2%}")
+    streak_column, best_column = st.columns(2)
+    streak_column.metric("Streak", f"{summary['current_streak']} days")
+    best_column.metric("Best streak", f"{summary['best_streak']} days")
+
+    st.subheader("Accuracy over time")
+    daily = pd.DataFrame(progress.get_daily_accuracy(learner_id))
+    st.line_chart(daily.pivot(index="day", columns="kind", values="accuracy"))
+
+    st.subheader("Videos")
+    videos = pd.DataFrame(progress.get_video_accuracy(learner_id))
+    video_ids = get_video_ids()
+    videos["video"] = [
+        get_video_name(video_id) if video_id in video_ids else video_id
+        for video_id in videos["video_id"]
+    ]
+    st.dataframe(
+        videos[["video", "kind", "attempts", "accuracy"]],
+        hide_index=True,
+        column_config={"accuracy": st.column_config.ProgressColumn(min_value=0, max_value=1)},
+    )
+
+    for kind, subheader in [("quiz", "Weakest quiz words"), ("shadow", "Hardest words to shadow")]:
+        st.subheader(subheader)
+        weakest_words = progress.get_weakest_words(learner_id, kind)
+        if weakest_words:
+            st.dataframe(
+                pd.DataFrame(weakest_words),
+                hide_index=True,
+                column_config={"accuracy": st.column_config.ProgressColumn(min_value=0, max_value=1)},
+            )
+        else:
+            st.write("Not enough answers yet.")
@@ -0,0 +1,411 @@
+import contextlib
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from functools import lru_cache
+
+DB_PATH = "data/progress.sqlite"
+RETRY_DELAY = 10 * 60
+WORD_STATS_TABLES = {"quiz": "word_stats", "shadow": "shadow_word_stats"}
+# Function words dominate any transcript, so they would crowd the weakest
+# shadowing words without saying much about the learner.
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "at",
+    "by", "for", "with", "from", "as", "is", "are", "was", "were", "be", "been",
+    "am", "it", "its", "i", "you", "he", "she", "we", "they", "me", "him",
+    "her", "us", "them", "my", "your", "his", "our", "their", "this", "that",
+    "so", "do", "does", "did", "not", "no", "yes", "oh", "uh", "um",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quiz_answers (
+    id INTEGER PRIMARY KEY,
+    learner_id TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    sentence_id TEXT NOT NULL,
+    sentence_start REAL NOT NULL,
+    sentence TEXT NOT NULL,
+    word TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    answered_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shadow_scores (
+    id INTEGER PRIMARY KEY,
+    learner_id TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    attempt_id TEXT NOT NULL,
+    sentence_id TEXT NOT NULL,
+    sentence_start REAL NOT NULL,
+    sentence TEXT NOT NULL,
+    score REAL NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS learner_streaks (
+    learner_id TEXT PRIMARY KEY,
+    last_day TEXT,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    best_streak INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS learner_stats (
+    learner_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (learner_id, kind)
+);
+CREATE TABLE IF NOT EXISTS daily_stats (
+    learner_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (learner_id, day, kind)
+);
+CREATE TABLE IF NOT EXISTS video_stats (
+    learner_id TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (learner_id, video_id, kind)
+);
+CREATE TABLE IF NOT EXISTS word_stats (
+    learner_id TEXT NOT NULL,
+    word TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (learner_id, word)
+);
+CREATE TABLE IF NOT EXISTS shadow_word_stats (
+    learner_id TEXT NOT NULL,
+    word TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (learner_id, word)
+);
+CREATE TABLE IF NOT EXISTS sentence_stats (
+    learner_id TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    sentence_id TEXT NOT NULL,
+    box INTEGER NOT NULL DEFAULT 0,
+    due_at REAL NOT NULL,
+    PRIMARY KEY (learner_id, video_id, sentence_id)
+);
+"""
+
+
+@lru_cache
+def init_db() -> None:
+    # WAL mode is persistent, so it only needs setting once per database.
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    with contextlib.closing(sqlite3.connect(DB_PATH, timeout=30)) as connection:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+
+
+@contextlib.contextmanager
+def connect():
+    """
+    Yield a connection inside a transaction and close it afterwards;
+    `sqlite3.Connection` as a context manager only commits.
+    """
+    init_db()
+    with contextlib.closing(sqlite3.connect(DB_PATH, timeout=30)) as connection:
+        with connection:
+            yield connection
+
+
+def update_learner_streak(connection: sqlite3.Connection, learner_id: str) -> None:
+    today = date.today()
+    row = connection.execute(
+        "SELECT last_day, current_streak, best_streak FROM learner_streaks WHERE learner_id = ?",
+        (learner_id,),
+    ).fetchone()
+    if row is None:
+        streak, best = 1, 1
+    else:
+        last_day, streak, best = row
+        if last_day == (today - timedelta(days=1)).isoformat():
+            streak += 1
+        elif last_day != today.isoformat():
+            streak = 1
+        best = max(best, streak)
+    connection.execute(
+        """
+        INSERT OR REPLACE INTO learner_streaks VALUES (?, ?, ?, ?)
+        """,
+        (learner_id, today.isoformat(), streak, best),
+    )
+
+
+def update_aggregates(
+    connection: sqlite3.Connection,
+    learner_id: str,
+    video_id: str,
+    kind: str,
+    score: float,
+) -> None:
+    update_learner_streak(connection, learner_id)
+    connection.execute(
+        """
+        INSERT INTO learner_stats VALUES (?, ?, 1, ?)
+        ON CONFLICT (learner_id, kind) DO UPDATE SET
+            attempts = attempts + 1, score_sum = score_sum + excluded.score_sum
+        """,
+        (learner_id, kind, score),
+    )
+    connection.execute(
+        """
+        INSERT INTO daily_stats VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT (learner_id, day, kind) DO UPDATE SET
+            attempts = attempts + 1, score_sum = score_sum + excluded.score_sum
+        """,
+        (learner_id, date.today().isoformat(), kind, score),
+    )
+    connection.execute(
+        """
+        INSERT INTO video_stats VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT (learner_id, video_id, kind) DO UPDATE SET
+            attempts = attempts + 1, score_sum = score_sum + excluded.score_sum
+        """,
+        (learner_id, video_id, kind, score),
+    )
+
+
+def update_word_stats(
+    connection: sqlite3.Connection,
+    learner_id: str,
+    kind: str,
+    word: str,
+    correct: bool,
+) -> None:
+    connection.execute(
+        f"""
+        INSERT INTO {WORD_STATS_TABLES[kind]} VALUES (?, ?, 1, ?, ?)
+        ON CONFLICT (learner_id, word) DO UPDATE SET
+            attempts = attempts + 1,
+            correct = correct + excluded.correct,
+            last_seen = excluded.last_seen
+        """,
+        (learner_id, word, int(correct), time.time()),
+    )
+
+
+def update_sentence_stats(
+    connection: sqlite3.Connection,
+    learner_id: str,
+    video_id: str,
+    sentence_id: str,
+    correct: bool,
+) -> None:
+    """
+    Leitner scheduling: a correct answer moves the sentence up one box and
+    doubles its review interval, a wrong one sends it back for a quick retry.
+    """
+    row = connection.execute(
+        """
+        SELECT box FROM sentence_stats
+        WHERE learner_id = ? AND video_id = ? AND sentence_id = ?
+        """,
+        (learner_id, video_id, sentence_id),
+    ).fetchone()
+    box = row[0] + 1 if row and correct else int(correct)
+    delay = timedelta(days=2 ** (box - 1)).total_seconds() if box else RETRY_DELAY
+    connection.execute(
+        """
+        INSERT OR REPLACE INTO sentence_stats VALUES (?, ?, ?, ?, ?)
+        """,
+        (learner_id, video_id, sentence_id, box, time.time() + delay),
+    )
+
+
+def record_quiz_answer(
+    learner_id: str,
+    video_id: str,
+    sentence: dict,
+    word: str,
+    correct: bool,
+) -> None:
+    word = word.lower()
+    with connect() as connection:
+        connection.execute(
+            """
+            INSERT INTO quiz_answers
+                (learner_id, video_id, sentence_id, sentence_start, sentence, word, correct, answered_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                learner_id,
+                video_id,
+                sentence["id"],
+                sentence["start"],
+                sentence["text"],
+                word,
+                int(correct),
+                time.time(),
+            ),
+        )
+        update_aggregates(connection, learner_id, video_id, "quiz", float(correct))
+        update_word_stats(connection, learner_id, "quiz", word, correct)
+        update_sentence_stats(
+            connection, learner_id, video_id, sentence["id"], correct
+        )
+
+
+def record_shadow_scores(
+    learner_id: str,
+    video_id: str,
+    attempt_id: str,
+    scores: list[dict],
+) -> None:
+    """
+    Store per-sentence shadowing scores.
+
+    Each score is a dict with the sentence `id`, `start` and `text`, the `score`
+    between 0 and 1, and the normalised reference words the learner `hit`
+    and `missed`. Word counts go to their own table, leaving out stopwords,
+    so they do not mix with quiz answers.
+    """
+    now = time.time()
+    with connect() as connection:
+        for score in scores:
+            connection.execute(
+                """
+                INSERT INTO shadow_scores
+                    (learner_id, video_id, attempt_id, sentence_id, sentence_start, sentence, score, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    learner_id,
+                    video_id,
+                    attempt_id,
+                    score["id"],
+                    score["start"],
+                    score["text"],
+                    score["score"],
+                    now,
+                ),
+            )
+            update_aggregates(
+                connection, learner_id, video_id, "shadow", score["score"]
+            )
+            for word in score["hit"]:
+                if word not in STOPWORDS:
+                    update_word_stats(connection, learner_id, "shadow", word, True)
+            for word in score["missed"]:
+                if word not in STOPWORDS:
+                    update_word_stats(connection, learner_id, "shadow", word, False)
+
+
+def get_learner_summary(learner_id: str) -> dict | None:
+    """
+    Return the learner's streaks and, per kind ("quiz" answers are right or
+    wrong, "shadow" scores are per-sentence WER accuracy), the number of
+    attempts and the mean score.
+    """
+    with connect() as connection:
+        streak = connection.execute(
+            """
+            SELECT current_streak, best_streak, last_day
+            FROM learner_streaks WHERE learner_id = ?
+            """,
+            (learner_id,),
+        ).fetchone()
+        rows = connection.execute(
+            """
+            SELECT kind, attempts, score_sum / attempts FROM learner_stats
+            WHERE learner_id = ?
+            """,
+            (learner_id,),
+        ).fetchall()
+    if streak is None:
+        return None
+    current_streak, best_streak, last_day = streak
+    if last_day not in (date.today().isoformat(), (date.today() - timedelta(days=1)).isoformat()):
+        current_streak = 0
+    return {
+        "kinds": {
+            kind: {"attempts": attempts, "accuracy": accuracy}
+            for kind, attempts, accuracy in rows
+        },
+        "current_streak": current_streak,
+        "best_streak": best_streak,
+    }
+
+
+def get_daily_accuracy(learner_id: str) -> list[dict]:
+    with connect() as connection:
+        rows = connection.execute(
+            """
+            SELECT day, kind, score_sum / attempts FROM daily_stats
+            WHERE learner_id = ? ORDER BY day
+            """,
+            (learner_id,),
+        ).fetchall()
+    return [{"day": day, "kind": kind, "accuracy": accuracy} for day, kind, accuracy in rows]
+
+
+def get_video_accuracy(learner_id: str) -> list[dict]:
+    with connect() as connection:
+        rows = connection.execute(
+            """
+            SELECT video_id, kind, attempts, score_sum / attempts FROM video_stats
+            WHERE learner_id = ? ORDER BY video_id, kind
+            """,
+            (learner_id,),
+        ).fetchall()
+    return [
+        {"video_id": video_id, "kind": kind, "attempts": attempts, "accuracy": accuracy}
+        for video_id, kind, attempts, accuracy in rows
+    ]
+
+
+def get_weakest_words(
+    learner_id: str, kind: str = "quiz", limit: int = 10, min_attempts: int = 2
+) -> list[dict]:
+    with connect() as connection:
+        rows = connection.execute(
+            f"""
+            SELECT word, attempts, CAST(correct AS REAL) / attempts AS accuracy
+            FROM {WORD_STATS_TABLES[kind]}
+            WHERE learner_id = ? AND attempts >= ?
+            ORDER BY accuracy ASC, attempts DESC
+            LIMIT ?
+            """,
+            (learner_id, min_attempts, limit),
+        ).fetchall()
+    return [
+        {"word": word, "attempts": attempts, "accuracy": accuracy}
+        for word, attempts, accuracy in rows
+    ]
+
+
+def select_review_sentences(
+    learner_id: str, video_id: str, sentences: list[dict], count: int
+) -> list[dict]:
+    """
+    Pick quiz sentences: overdue reviews first, then unseen sentences in
+    random order, then the ones that are due soonest.
+    """
+    with connect() as connection:
+        rows = connection.execute(
+            """
+            SELECT sentence_id, due_at FROM sentence_stats
+            WHERE learner_id = ? AND video_id = ?
+            """,
+            (learner_id, video_id),
+        ).fetchall()
+    due_at = dict(rows)
+    now = time.time()
+    unseen = [s for s in sentences if s["id"] not in due_at]
+    random.shuffle(unseen)
+    seen = sorted(
+        (s for s in sentences if s["id"] in due_at), key=lambda s: due_at[s["id"]]
+    )
+    overdue = [s for s in seen if due_at[s["id"]] <= now]
+    upcoming = [s for s in seen if due_at[s["id"]] > now]
+    return (overdue + unseen + upcoming)[:count]